@@ -1,17 +1,19 @@
 #!/usr/bin/env python3
-"""Entrypoint script for Claude Agent SDK inside Modal sandbox."""
+"""Long-lived Claude Agent SDK server inside Modal sandbox, driven over stdin/stdout."""
 
 import argparse
 import asyncio
 import json
 import os
 import sys
+import traceback
 from pathlib import Path
 
 from claude_agent_sdk import ClaudeAgentOptions, ClaudeSDKClient, HookMatcher, ResultMessage
-from slack_tool_logger import SlackLogger
+from slack_tool_logger import SlackLogger, close_client
 
-SESSIONS_FILE = Path("/data/sessions.json")
+SESSIONS_DIR = Path("/data/sessions")
+LEGACY_SESSIONS_FILE = Path("/data/sessions.json")  # Pre-split layout, read-only fallback
 
 
 def log(msg: str) -> None:
@@ -39,31 +41,38 @@ Changes stay in this sandbox session. Use `gh` CLI for GitHub operations like cr
 
 def load_session_id(sandbox_name: str) -> str | None:
     """Load existing session ID for this sandbox/thread."""
-    if not SESSIONS_FILE.exists():
-        return None
-    sessions = json.loads(SESSIONS_FILE.read_text())
-    return sessions.get(sandbox_name)
+    session_file = SESSIONS_DIR / f"{sandbox_name}.txt"
+    if session_file.exists():
+        return session_file.read_text().strip() or None
+    if LEGACY_SESSIONS_FILE.exists():
+        return json.loads(LEGACY_SESSIONS_FILE.read_text()).get(sandbox_name)
+    return None
 
 
 def save_session_id(sandbox_name: str, session_id: str) -> None:
-    """Save session ID for this sandbox/thread."""
-    sessions = {}
-    if SESSIONS_FILE.exists():
-        sessions = json.loads(SESSIONS_FILE.read_text())
-    sessions[sandbox_name] = session_id
-    SESSIONS_FILE.write_text(json.dumps(sessions, indent=2))
+    """Save session ID for this sandbox/thread (atomic write-then-rename)."""
+    # No parents=True: if setup never linked /data to the volume, fail here rather than
+    # create a local /data that would swallow the link and the sessions
+    SESSIONS_DIR.mkdir(exist_ok=True)
+    session_file = SESSIONS_DIR / f"{sandbox_name}.txt"
+    tmp_file = session_file.with_suffix(".txt.tmp")
+    tmp_file.write_text(session_id)
+    os.replace(tmp_file, session_file)
 
 
-async def main(user_msg: str, sandbox_name: str, sandbox_id: str, channel: str | None, thread_ts: str | None):
-    log(f"Starting agent for sandbox={sandbox_name}")
-    log(f"User message: {user_msg[:100]}...")
+def emit(payload: dict) -> None:
+    """Write one protocol message to stdout (one JSON object per line)."""
+    print(json.dumps(payload), flush=True)
 
-    # Use the sandbox ID as the API key for the proxy. The proxy will exchange it
-    # for the real key, as long as the sandbox is still running.
-    os.environ["ANTHROPIC_API_KEY"] = sandbox_id
+
+async def run_turn(user_msg: str, sandbox_name: str, channel: str | None, thread_ts: str | None) -> None:
+    """Run one Claude turn, emitting response text as it streams."""
+    log(f"Starting agent turn for sandbox={sandbox_name}")
+    log(f"User message: {user_msg[:100]}...")
 
     # Set up tool logging hooks if Slack channel info provided
     hooks = None
+    slack_logger = None
     if channel and thread_ts:
         log(f"Setting up Slack tool logger for channel={channel}")
         slack_logger = SlackLogger(channel, thread_ts)
@@ -75,11 +84,11 @@ async def main(user_msg: str, sandbox_name: str, sandbox_id: str, channel: str |
     session_id = load_session_id(sandbox_name)
     log(f"Loaded session_id={session_id}")
 
-    # Print session status for user (goes to stdout → Slack)
+    # Session status for user (goes to stdout → Slack)
     if session_id:
-        print("🔄 Resuming conversation", flush=True)
+        emit({"response": "🔄 Resuming conversation"})
     else:
-        print("✨ New conversation", flush=True)
+        emit({"response": "✨ New conversation"})
 
     options = ClaudeAgentOptions(
         resume=session_id,
@@ -92,29 +101,76 @@ async def main(user_msg: str, sandbox_name: str, sandbox_id: str, channel: str |
     )
 
     log("Connecting to Claude SDK...")
-    async with ClaudeSDKClient(options=options) as client:
-        await client.query(user_msg)
-        log("Query sent, receiving response...")
+    try:
+        async with ClaudeSDKClient(options=options) as client:
+            await client.query(user_msg)
+            log("Query sent, receiving response...")
+
+            async for msg in client.receive_response():
+                if isinstance(msg, ResultMessage):
+                    log(f"Got ResultMessage, session_id={msg.session_id}")
+                    save_session_id(sandbox_name, msg.session_id)
+                elif hasattr(msg, "content"):
+                    for block in msg.content:
+                        if hasattr(block, "text"):
+                            emit({"response": block.text})
+
+            log("Agent turn complete")
+    finally:
+        if slack_logger:
+            # Flush the final coalesced tool status
+            await slack_logger.close()
+
+
+async def main(
+    sandbox_name: str, sandbox_id: str, channel: str | None, thread_ts: str | None, idle_timeout: float
+):
+    """Serve agent turns read from stdin as JSON lines until idle or stdin closes.
+
+    Each request is `{"message": ...}`; the reply is any number of `{"response": ...}` or
+    `{"error": ...}` lines followed by `{"done": true}`.
+    """
+    log(f"Starting agent daemon for sandbox={sandbox_name}")
 
-        async for msg in client.receive_response():
-            if isinstance(msg, ResultMessage):
-                log(f"Got ResultMessage, session_id={msg.session_id}")
-                save_session_id(sandbox_name, msg.session_id)
-            elif hasattr(msg, "content"):
-                for block in msg.content:
-                    if hasattr(block, "text"):
-                        print(block.text, flush=True)
+    # Use the sandbox ID as the API key for the proxy. The proxy will exchange it
+    # for the real key, as long as the sandbox is still running.
+    os.environ["ANTHROPIC_API_KEY"] = sandbox_id
 
-        log("Agent turn complete")
+    loop = asyncio.get_running_loop()
+    stdin = asyncio.StreamReader(limit=16 * 1024 * 1024)  # Messages arrive as a single line
+    await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(stdin), sys.stdin)
+
+    try:
+        while True:
+            try:
+                line = await asyncio.wait_for(stdin.readline(), timeout=idle_timeout)
+            except asyncio.TimeoutError:
+                # Exit so an idle daemon doesn't hold the sandbox open
+                log(f"No request for {idle_timeout:.0f}s, exiting")
+                break
+            if not line:
+                log("stdin closed, exiting")
+                break
+
+            request = json.loads(line)
+            try:
+                await run_turn(request["message"], sandbox_name, channel, thread_ts)
+            except Exception as e:
+                traceback.print_exc()
+                emit({"error": f"{type(e).__name__}: {e}"})
+            finally:
+                emit({"done": True})
+    finally:
+        await close_client()
 
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
-    parser.add_argument("--message", type=str, required=True)
     parser.add_argument("--sandbox-name", type=str, required=True)
     parser.add_argument("--sandbox-id", type=str, required=True)
     parser.add_argument("--channel", type=str, required=False)
     parser.add_argument("--thread-ts", type=str, required=False)
+    parser.add_argument("--idle-timeout", type=float, default=4 * 60)
     args = parser.parse_args()
 
-    asyncio.run(main(args.message, args.sandbox_name, args.sandbox_id, args.channel, args.thread_ts))
+    asyncio.run(main(args.sandbox_name, args.sandbox_id, args.channel, args.thread_ts, args.idle_timeout))
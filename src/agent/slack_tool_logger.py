@@ -1,8 +1,12 @@
+import asyncio
 import os
+from collections import deque
+from os.path import basename as _basename
 from typing import Any
 
-import slack_sdk
+import aiohttp
 from claude_agent_sdk import HookContext
+from slack_sdk.web.async_client import AsyncWebClient
 
 # Tool icons for compact display
 TOOL_ICONS = {
@@ -17,15 +21,123 @@ TOOL_ICONS = {
 }
 
 
+def _file_summary(verb: str):
+    """Build a summarizer for tools that act on a single file."""
+
+    def summarize(tool_input: dict, icon: str) -> str:
+        path = tool_input.get("file_path", "")
+        filename = _basename(path) if path else "file"
+        return f"{icon} {verb} `{filename}`"
+
+    return summarize
+
+
+def _bash_summary(tool_input: dict, icon: str) -> str:
+    cmd = tool_input.get("command", "")
+    # Truncate long commands
+    if len(cmd) > 40:
+        cmd = cmd[:37] + "..."
+    return f"{icon} `{cmd}`"
+
+
+def _search_summary(tool_input: dict, icon: str) -> str:
+    return f"{icon} Searching `{tool_input.get('pattern', '')}`"
+
+
+# One-line summary builders by tool name; tools not listed show just their name
+TOOL_SUMMARIES = {
+    "Read": _file_summary("Reading"),
+    "Write": _file_summary("Writing"),
+    "Edit": _file_summary("Editing"),
+    "Bash": _bash_summary,
+    "Glob": _search_summary,
+    "Grep": _search_summary,
+}
+
+
+def _truncate_response(response: dict, limit: int = 500) -> str:
+    """Render a tool response like str(dict), truncated to limit chars.
+
+    Values are cut before formatting so large payloads (e.g. file contents or content
+    lists) are never stringified in full just to be thrown away.
+    """
+    return _truncate_value(response, limit)
+
+
+def _truncate_value(value: Any, limit: int) -> str:
+    if isinstance(value, str):
+        return repr(value[:limit])
+    if isinstance(value, dict):
+        items = (f"{k!r}: {_truncate_value(v, limit)}" for k, v in value.items())
+        return _join_truncated("{", items, "}", limit)
+    if isinstance(value, list):
+        return _join_truncated("[", (_truncate_value(v, limit) for v in value), "]", limit)
+    return str(value)[:limit]
+
+
+def _join_truncated(opening: str, items, closing: str, limit: int) -> str:
+    """Join rendered items, stopping once past limit so the rest are never formatted."""
+    parts = []
+    size = 0
+    for part in items:
+        parts.append(part)
+        size += len(part) + 2
+        if size > limit:
+            break
+    text = opening + ", ".join(parts) + closing
+    return text if len(text) <= limit else text[:limit] + "..."
+
+
+# Static header of the status message, shared by every update (never mutated)
+WORKING_BLOCK = {
+    "type": "context",
+    "elements": [
+        {"type": "mrkdwn", "text": "🤖 *Working...*"}
+    ]
+}
+
+# Minimum seconds between status message updates
+STATUS_FLUSH_INTERVAL = 0.5
+
+_SLACK_CLIENT: AsyncWebClient | None = None
+
+
+def _get_client() -> AsyncWebClient:
+    """Return the process-wide Slack client, creating it on first use.
+
+    AsyncWebClient opens a new aiohttp session per call unless given one, so the shared
+    client owns a session that keeps its TLS connection to slack.com alive between calls.
+    """
+    global _SLACK_CLIENT
+    if _SLACK_CLIENT is None:
+        _SLACK_CLIENT = AsyncWebClient(token=os.environ["SLACK_BOT_TOKEN"], session=aiohttp.ClientSession())
+    return _SLACK_CLIENT
+
+
+async def close_client() -> None:
+    """Close the shared Slack client's HTTP session."""
+    global _SLACK_CLIENT
+    if _SLACK_CLIENT is not None:
+        await _SLACK_CLIENT.session.close()
+        _SLACK_CLIENT = None
+
+
 class SlackLogger:
     """Logs Claude agent tool use to Slack threads with compact Block Kit display."""
 
     def __init__(self, channel: str, thread_ts: str):
-        self.slack_client = slack_sdk.WebClient(token=os.environ["SLACK_BOT_TOKEN"])
+        self.slack_client = _get_client()
         self.channel = channel
         self.thread_ts = thread_ts
         self.status_ts: str | None = None  # Track the status message to update
-        self.tools_used: list[str] = []
+        # Keep only last 5 tools to avoid message getting too long
+        self.tools_used: deque[str] = deque(maxlen=5)
+        # Tool summaries waiting to be flushed to the status message
+        self._pending: deque[str] = deque()
+        self._pending_event = asyncio.Event()
+        self._flusher: asyncio.Task | None = None
+        self._closed = False
+        self._last_sent: int | None = None  # Hash of the last tool list sent to Slack
 
     async def log_tool_use(
         self, input_data: dict[str, Any], tool_use_id: str | None, context: HookContext
@@ -34,57 +146,66 @@ class SlackLogger:
         if "tool_input" in input_data:
             tool_name = input_data.get("tool_name", "Unknown")
             tool_input = input_data["tool_input"]
-            self._update_status(tool_name, tool_input, is_response=False)
+            self._pending.append(self._get_tool_summary(tool_name, tool_input))
+            self._pending_event.set()
+            if self._flusher is None:
+                self._flusher = asyncio.create_task(self._flush_loop())
         elif "tool_response" in input_data:
             # Check for errors in response
             response = input_data.get("tool_response", {})
             if response.get("is_error"):
-                self._post_error(response)
+                await self._post_error(response)
         return {}
 
     def _get_tool_summary(self, tool_name: str, tool_input: dict) -> str:
         """Get a one-line summary of the tool use."""
         icon = TOOL_ICONS.get(tool_name, "⚙️")
+        summarize = TOOL_SUMMARIES.get(tool_name)
+        return summarize(tool_input, icon) if summarize else f"{icon} {tool_name}"
 
-        if tool_name == "Read":
-            path = tool_input.get("file_path", "")
-            filename = os.path.basename(path) if path else "file"
-            return f"{icon} Reading `{filename}`"
-        elif tool_name == "Write":
-            path = tool_input.get("file_path", "")
-            filename = os.path.basename(path) if path else "file"
-            return f"{icon} Writing `{filename}`"
-        elif tool_name == "Edit":
-            path = tool_input.get("file_path", "")
-            filename = os.path.basename(path) if path else "file"
-            return f"{icon} Editing `{filename}`"
-        elif tool_name == "Bash":
-            cmd = tool_input.get("command", "")
-            # Truncate long commands
-            if len(cmd) > 40:
-                cmd = cmd[:37] + "..."
-            return f"{icon} `{cmd}`"
-        elif tool_name in ("Glob", "Grep"):
-            pattern = tool_input.get("pattern", "")
-            return f"{icon} Searching `{pattern}`"
-        else:
-            return f"{icon} {tool_name}"
+    async def close(self) -> None:
+        """Stop the background flusher and send any pending status update."""
+        self._closed = True
+        if self._flusher is not None:
+            self._pending_event.set()
+            await self._flusher
+            self._flusher = None
+        await self._safe_flush()
 
-    def _update_status(self, tool_name: str, tool_input: dict, is_response: bool) -> None:
-        """Update or create the status message showing tool activity."""
-        summary = self._get_tool_summary(tool_name, tool_input)
-        self.tools_used.append(summary)
+    async def _flush_loop(self) -> None:
+        """Coalesce queued tool summaries into at most one status update per interval."""
+        while not self._closed:
+            await self._pending_event.wait()
+            self._pending_event.clear()
+            await self._safe_flush()
+            if not self._closed:
+                await asyncio.sleep(STATUS_FLUSH_INTERVAL)
 
-        # Keep only last 5 tools to avoid message getting too long
-        display_tools = self.tools_used[-5:]
+    async def _safe_flush(self) -> None:
+        """Flush without raising; the status display is best-effort."""
+        try:
+            await self._flush()
+        except Exception:
+            pass
 
+    async def _flush(self) -> None:
+        """Drain pending summaries and update the status message if the display changed."""
+        if not self._pending:
+            return
+        while self._pending:
+            self.tools_used.append(self._pending.popleft())
+
+        display_tools = tuple(self.tools_used)
+        display_hash = hash(display_tools)
+        if display_hash == self._last_sent:
+            return
+        await self._update_status(display_tools)
+        self._last_sent = display_hash
+
+    async def _update_status(self, display_tools: tuple[str, ...]) -> None:
+        """Update or create the status message showing tool activity."""
         blocks = [
-            {
-                "type": "context",
-                "elements": [
-                    {"type": "mrkdwn", "text": "🤖 *Working...*"}
-                ]
-            },
+            WORKING_BLOCK,
             {
                 "type": "section",
                 "text": {
@@ -97,7 +218,7 @@ class SlackLogger:
         if self.status_ts:
             # Update existing message
             try:
-                self.slack_client.chat_update(
+                await self.slack_client.chat_update(
                     channel=self.channel,
                     ts=self.status_ts,
                     blocks=blocks,
@@ -105,13 +226,13 @@ class SlackLogger:
                 )
             except Exception:
                 # If update fails, post new message
-                self._post_new_status(blocks)
+                await self._post_new_status(blocks)
         else:
-            self._post_new_status(blocks)
+            await self._post_new_status(blocks)
 
-    def _post_new_status(self, blocks: list) -> None:
+    async def _post_new_status(self, blocks: list) -> None:
         """Post a new status message and track its timestamp."""
-        response = self.slack_client.chat_postMessage(
+        response = await self.slack_client.chat_postMessage(
             channel=self.channel,
             thread_ts=self.thread_ts,
             blocks=blocks,
@@ -119,11 +240,9 @@ class SlackLogger:
         )
         self.status_ts = response["ts"]
 
-    def _post_error(self, response: dict) -> None:
+    async def _post_error(self, response: dict) -> None:
         """Post error details when a tool fails."""
-        error_msg = str(response)
-        if len(error_msg) > 500:
-            error_msg = error_msg[:500] + "..."
+        error_msg = _truncate_response(response)
 
         blocks = [
             {
@@ -135,7 +254,7 @@ class SlackLogger:
             }
         ]
 
-        self.slack_client.chat_postMessage(
+        await self.slack_client.chat_postMessage(
             channel=self.channel,
             thread_ts=self.thread_ts,
             blocks=blocks,
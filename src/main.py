@@ -1,6 +1,13 @@
+import asyncio
+import contextlib
+import json
 import logging
 import os
 import re
+import shlex
+import string
+import time
+from collections import OrderedDict, deque
 from pathlib import Path
 
 import modal
@@ -23,6 +30,20 @@ vol = modal.Volume.from_name("oracle-workspace", create_if_missing=True)
 AGENT_ENTRYPOINT = Path(__file__).parent / "agent"
 VOL_MOUNT_PATH = Path("/workspace")
 DEBUG_TOOL_USE = True
+REPO_URL = "git@github.com:ostegm/OracleLoop.git"
+REPO_BRANCH = "main"
+UV_CACHE_DIR = (VOL_MOUNT_PATH / "uv-cache").as_posix()  # Shared uv wheel cache for `uv sync`
+REPO_FRESH_TTL = 5 * 60  # Skip updating the repo if it was updated within this many seconds
+REPO_FRESH_SENTINEL = "/app/OracleLoop/.git/oracle-fresh"
+REPO_SYNCED_MARKER = "/app/OracleLoop/.git/oracle-synced"  # Hash of the dependency files last synced
+# Identifies the dependency set `uv sync` installed; run from the OracleLoop checkout
+LOCK_HASH_CMD = "cat uv.lock pyproject.toml 2>/dev/null | sha256sum"
+AGENT_IDLE_TIMEOUT = 4 * 60  # Agent process exits after this long without a turn (< sandbox idle_timeout)
+RESPONSE_BATCH_WINDOW = 0.5  # Seconds to gather agent responses into one Slack message
+RESPONSE_BATCH_MAX_CHARS = 3000  # Post early once a batch reaches this size
+AGENT_STALL_TIMEOUT = 30  # Show new stderr errors once the agent has been silent this long mid-turn
+STDERR_DRAIN_GRACE = 5  # Seconds to collect a dead agent's remaining stderr before reporting it
+SLACK_POST_INTERVAL = 1.0  # Minimum seconds between posts to one thread (Slack allows ~1/s per channel)
 
 sandbox_image = (
     modal.Image.debian_slim(python_version="3.12")
@@ -45,147 +66,551 @@ sandbox_image = (
     .run_commands("curl -LsSf https://astral.sh/uv/install.sh | sh")
     .env({"PATH": "/root/.local/bin:$PATH", "AGENT_VERSION": "2"})
     # Python dependencies
-    .pip_install("claude-agent-sdk", "slack-sdk")
+    .pip_install("claude-agent-sdk", "slack-sdk", "aiohttp")  # aiohttp backs slack_sdk's AsyncWebClient
     # Configure SSH for GitHub + cache bust
     .run_commands(
         "mkdir -p /root/.ssh",
         "ssh-keyscan github.com >> /root/.ssh/known_hosts",
         "echo 'agent-v2' > /root/.agent-version",
     )
+    # Bake OracleLoop and its venv into the image so new sandboxes start with a checkout; setup
+    # only has to fetch the branch tip. The deploy key is only on disk for the clone.
+    .run_commands(
+        "printf '%s\\n' \"$GITHUB_DEPLOY_KEY\" > /tmp/deploy_key && chmod 600 /tmp/deploy_key"
+        " && GIT_SSH_COMMAND='ssh -i /tmp/deploy_key'"
+        f" git clone --depth=1 --branch {REPO_BRANCH} {REPO_URL} /app/OracleLoop"
+        "; status=$?; rm -f /tmp/deploy_key; exit $status",
+        f"cd /app/OracleLoop && uv sync && {LOCK_HASH_CMD} > {REPO_SYNCED_MARKER}",
+        secrets=[github_deploy_key],
+    )
     # Add entrypoint script (with cache-busting comment to force rebuild)
     # v2: logs to stderr, session status output
     .add_local_dir(AGENT_ENTRYPOINT, "/agent")
 )
 
-slack_bot_image = modal.Image.debian_slim(python_version="3.12").pip_install("slack-bolt", "fastapi")
-
-
-def setup_github_ssh(sb: modal.Sandbox) -> None:
-    """Write GitHub deploy key from environment to SSH config."""
-    deploy_key = os.environ.get("GITHUB_DEPLOY_KEY", "")
-    logger.info(f"SSH key present: {bool(deploy_key)}, length: {len(deploy_key)}")
-
-    if deploy_key:
-        sb.exec(
-            "bash",
-            "-c",
-            f'echo "{deploy_key}" > /root/.ssh/id_ed25519 && chmod 600 /root/.ssh/id_ed25519',
-        ).wait()
-        logger.info("SSH key written to sandbox")
-    else:
-        logger.warning("No SSH key found in environment!")
-
-
-def clone_or_update_repo(sb: modal.Sandbox) -> None:
-    """Clone OracleLoop if missing, otherwise pull latest."""
-    # Check if repo exists
-    check = sb.exec("test", "-d", "/app/OracleLoop/.git")
-    if check.wait() == 0:
-        logger.info("Repo exists, pulling latest")
-        sb.exec("bash", "-c", "cd /app/OracleLoop && git pull").wait()
-        return
+slack_bot_image = modal.Image.debian_slim(python_version="3.12").pip_install("slack-bolt", "fastapi", "aiohttp")
+
+
+# Sandbox setup in one exec: deploy key, /data symlink, then fetch the branch tip into the
+# OracleLoop checkout baked into the image if the last update is older than REPO_FRESH_TTL
+# (re-running `uv sync` only when the dependency files differ from the last successful sync, so
+# a failed sync is retried). Updates use `reset --keep`, which keeps
+# the agent's uncommitted edits (and aborts if they conflict), and only apply while the checkout
+# is on the default branch. The key comes from the sandbox's own github-deploy-key secret, so it
+# is never interpolated into the command line.
+SETUP_SCRIPT = """
+exec 2>&1
+set -e
+if [ -n "$GITHUB_DEPLOY_KEY" ]; then
+    printf '%s\\n' "$GITHUB_DEPLOY_KEY" > /root/.ssh/id_ed25519
+    chmod 600 /root/.ssh/id_ed25519
+    echo "SSH key written to sandbox"
+else
+    echo "No SSH key found in environment!"
+fi
+
+# /data doesn't depend on the repo; link it in the background and collect it at the end
+(mkdir -p {data_dir} && ln -sf {data_dir} /data) &
+data_pid=$!
+
+if [ -d /app/OracleLoop/.git ]; then
+    age=$(( $(date +%s) - $(stat -c %Y {sentinel} 2>/dev/null || echo 0) ))
+    cd /app/OracleLoop
+    if [ $age -lt {ttl} ]; then
+        echo "Repo updated recently, skipping fetch"
+    else
+        fresh=
+        if [ "$(git rev-parse --abbrev-ref HEAD)" != {branch} ]; then
+            echo "Repo not on {branch}, skipping update"
+        elif ! git fetch --depth=1 origin {branch} >/dev/null; then
+            echo "Fetch FAILED"
+        elif [ "$(git rev-parse HEAD)" = "$(git rev-parse FETCH_HEAD)" ]; then
+            fresh=1
+            echo "Repo already up to date"
+        elif git reset --keep FETCH_HEAD >/dev/null; then
+            fresh=1
+            echo "Repo updated to latest"
+        else
+            echo "Update FAILED (local changes conflict)"
+        fi
+        # Compare with what was last synced, not the previous HEAD: HEAD has already moved
+        # if an earlier sync failed. The marker and sentinel are only written once it succeeds.
+        lock_hash=$({lock_hash})
+        if [ "$lock_hash" != "$(cat {synced} 2>/dev/null)" ]; then
+            echo "Dependencies changed, syncing..."
+            uv sync
+            echo "$lock_hash" > {synced}
+        fi
+        if [ -n "$fresh" ]; then
+            touch {sentinel}
+        fi
+    fi
+else
+    # Only reached if the image was built without the baked checkout
+    echo "Cloning OracleLoop repo..."
+    git clone --depth=1 --branch {branch} {repo_url} /app/OracleLoop >/dev/null
+    echo "Clone successful, installing dependencies..."
+    cd /app/OracleLoop && uv sync
+    {lock_hash} > {synced}
+    touch {sentinel}
+    echo "Dependencies installed"
+fi
+
+wait $data_pid
+"""
+
+
+async def start_sandbox_setup(sb: modal.Sandbox, sandbox_name: str):
+    """Start setting up SSH, the OracleLoop repo and /data in a single sandbox exec.
+
+    Returns the running process without waiting, so the caller can overlap other work with it.
+    """
+    script = SETUP_SCRIPT.format(
+        data_dir=shlex.quote((VOL_MOUNT_PATH / sandbox_name).as_posix()),
+        sentinel=REPO_FRESH_SENTINEL,
+        synced=REPO_SYNCED_MARKER,
+        lock_hash=LOCK_HASH_CMD,
+        ttl=REPO_FRESH_TTL,
+        repo_url=REPO_URL,
+        branch=REPO_BRANCH,
+    )
+    return await sb.exec.aio("bash", "-c", script, text=False)
 
-    logger.info("Cloning OracleLoop repo...")
-    clone = sb.exec("git", "clone", "git@github.com:ostegm/OracleLoop.git", "/app/OracleLoop")
-    stdout_lines = list(clone.stdout)
-    exit_code = clone.wait()
-    stderr = clone.stderr.read()
 
+async def wait_for_sandbox_setup(setup, sandbox_name: str) -> bool:
+    """Stream a setup process's output into the logs and wait for it. Returns success."""
+    async for line in aiter_lines(setup.stdout):
+        if line:
+            logger.info(f"[{sandbox_name}] {line.decode(errors='replace')}")
+    exit_code = await setup.wait.aio()
     if exit_code != 0:
-        logger.error(f"Clone FAILED (exit {exit_code}): {stderr}")
-        return
+        logger.error(f"[{sandbox_name}] Setup FAILED (exit {exit_code})")
+    return exit_code == 0
+
+
+async def aiter_lines(stream):
+    """Yield complete lines from a binary sandbox output stream, which delivers arbitrary chunks."""
+    buf = b""
+    async for chunk in stream:
+        buf += chunk
+        *lines, buf = buf.split(b"\n")
+        for line in lines:
+            yield line
+    if buf:
+        yield buf
+
+
+class AgentProcess:
+    """A long-lived agent_entrypoint.py server in a sandbox, driven one turn at a time.
+
+    Keeping the process around between turns skips Python startup and SDK imports when
+    consecutive messages in a thread reach the same worker container. Spawned messages run on
+    whichever container Modal picks, so that is a best-effort hit: another container starts
+    its own daemon in the same sandbox, and each one keeps the sandbox busy until it exits by
+    itself after AGENT_IDLE_TIMEOUT.
+    """
+
+    def __init__(self, process, sandbox_id: str, sandbox_name: str):
+        self.process = process
+        self.sandbox_id = sandbox_id
+        self.sandbox_name = sandbox_name
+        self.lock = asyncio.Lock()  # One turn at a time per process
+        self.last_used = time.monotonic()
+        self.error_lines: deque[str] = deque(maxlen=50)
+        self.error_count = 0  # Errors seen this turn, including any pushed out of error_lines
+        # Set when a turn ends before its "done" line; the rest of its output would be read
+        # by the next turn, so the process is not reused
+        self.abandoned = False
+
+        # Stdout is read by its own task so run_turn can flush batched responses on a
+        # timer instead of only when the next line happens to arrive. None marks EOF.
+        self.stdout_lines: asyncio.Queue[bytes | None] = asyncio.Queue()
+        self.stdout_task = asyncio.create_task(self._read_stdout())
+
+        # Stderr contains [LOG] messages and actual errors. Drain it alongside stdout so logs
+        # show up during the turn and a full stderr pipe can't stall the agent.
+        self.stderr_task = asyncio.create_task(self._drain_stderr())
+
+    @classmethod
+    async def start(cls, sb: modal.Sandbox, channel: str, thread_ts: str, sandbox_name: str) -> "AgentProcess":
+        """Launch the agent server in the sandbox."""
+        args = [
+            "python", "-u",  # Unbuffered output for real-time logging
+            "/agent/agent_entrypoint.py",
+            "--sandbox-name", sandbox_name,
+            "--sandbox-id", sb.object_id,
+            "--idle-timeout", str(AGENT_IDLE_TIMEOUT),
+        ]
+
+        if DEBUG_TOOL_USE:
+            args.extend(["--channel", channel, "--thread-ts", thread_ts])
+
+        logger.info(f"[{sandbox_name}] Starting agent process")
+        # Binary mode: stdout lines go straight to json.loads and stderr is split without
+        # decoding every chunk first
+        process = await sb.exec.aio(*args, text=False)
+        return cls(process, sb.object_id, sandbox_name)
+
+    async def _read_stdout(self) -> None:
+        async for line in aiter_lines(self.process.stdout):
+            self.stdout_lines.put_nowait(line)
+        self.stdout_lines.put_nowait(None)
+
+    async def _drain_stderr(self) -> None:
+        async for raw_line in aiter_lines(self.process.stderr):
+            if not raw_line:
+                continue
+            line = raw_line.decode(errors="replace")
+            if raw_line.startswith(b"[LOG]"):
+                # Internal log message - just log it, don't show user
+                logger.info(f"[{self.sandbox_name}] {line}")
+            else:
+                # Actual error - log and show user if the process dies or stalls
+                logger.error(f"[{self.sandbox_name}] STDERR: {line}")
+                self.error_lines.append(line)
+                self.error_count += 1
+
+    def _new_errors(self, reported: int) -> str:
+        """The error lines that arrived after the first `reported` of this turn."""
+        lines = list(self.error_lines)[-(self.error_count - reported):]
+        return "*** ERROR ***\n" + "\n".join(lines)
+
+    async def is_usable(self, sb: modal.Sandbox) -> bool:
+        """Whether this process can take another turn in the given sandbox."""
+        # Leave a margin so we never write to a daemon that is about to idle out
+        idle = time.monotonic() - self.last_used
+        return (
+            not self.abandoned
+            and self.sandbox_id == sb.object_id
+            and idle < AGENT_IDLE_TIMEOUT - 30
+            and await self.process.poll.aio() is None
+        )
+
+    async def run_turn(self, user_message: str):
+        """Send one message and yield response dicts until the agent reports the turn is done."""
+        async with self.lock:
+            self.error_lines.clear()
+            self.error_count = 0
+            reported = 0
+            last_output = time.monotonic()
+            done = False
+            try:
+                self.process.stdin.write(json.dumps({"message": user_message}).encode() + b"\n")
+                await self.process.stdin.drain.aio()
+
+                # Batch responses that arrive close together into one Slack message
+                buf: list[str] = []
+                buf_chars = 0
+                flush_at: float | None = None
+                while True:
+                    if flush_at is not None:
+                        timeout = max(0.0, flush_at - time.monotonic())
+                    else:
+                        timeout = max(1.0, last_output + AGENT_STALL_TIMEOUT - time.monotonic())
+                    try:
+                        line = await asyncio.wait_for(self.stdout_lines.get(), timeout)
+                    except asyncio.TimeoutError:
+                        line = b""  # Batch window or stall check elapsed
+                    if line is None:
+                        break
+                    msg = {}
+                    if line:
+                        last_output = time.monotonic()
+                    if line.strip():
+                        try:
+                            msg = json.loads(line)
+                        except json.JSONDecodeError:
+                            msg = None
+                        if not isinstance(msg, dict):
+                            logger.warning(f"[{self.sandbox_name}] Unexpected agent output: {line[:100]!r}")
+                            msg = {}
+
+                    text = (msg.get("response") or "").strip()
+                    if text:
+                        logger.info(f"[{self.sandbox_name}] Response: {text[:100]}...")
+                        buf.append(text)
+                        buf_chars += len(text)
+                        flush_at = flush_at or time.monotonic() + RESPONSE_BATCH_WINDOW
+
+                    if buf and (
+                        buf_chars >= RESPONSE_BATCH_MAX_CHARS
+                        or time.monotonic() >= flush_at
+                        or "response" not in msg
+                    ):
+                        yield {"response": "\n\n".join(buf)}
+                        buf.clear()
+                        buf_chars = 0
+                        flush_at = None
+                    if msg.get("error"):
+                        yield {"response": f"*** ERROR ***\n{msg['error']}"}
+                    if msg.get("done"):
+                        done = True
+                        return
+
+                    # A silent agent that is writing errors is likely stuck; say so without
+                    # waiting for it to exit
+                    if self.error_count > reported and time.monotonic() - last_output >= AGENT_STALL_TIMEOUT:
+                        yield {"response": self._new_errors(reported)}
+                        reported = self.error_count
+
+                if buf:
+                    yield {"response": "\n\n".join(buf)}
+                # Stdout closed before the turn finished: the process died. Report its errors
+                # without waiting on a stderr pipe that might never close.
+                await asyncio.wait([self.stderr_task], timeout=STDERR_DRAIN_GRACE)
+                if self.error_count > reported:
+                    yield {"response": self._new_errors(reported)}
+                logger.info(f"[{self.sandbox_name}] Agent exited with status {await self.process.poll.aio()}")
+            finally:
+                self.last_used = time.monotonic()
+                if not done:
+                    # Errored, cancelled, or the process died: retire it and let a fresh
+                    # daemon take the next turn. Closing stdin makes this one exit.
+                    self.abandoned = True
+                    asyncio.create_task(self._close_stdin())
+
+    async def _close_stdin(self) -> None:
+        try:
+            self.process.stdin.write_eof()
+            await self.process.stdin.drain.aio()
+        except Exception:
+            pass  # Already gone
 
-    logger.info("Clone successful, installing dependencies...")
-    sb.exec("bash", "-c", "cd /app/OracleLoop && uv sync").wait()
-    logger.info("Dependencies installed")
 
+# Agent processes by sandbox name, reused only by later turns this container happens to receive
+_agent_processes: dict[str, AgentProcess] = {}
+# Per-sandbox locks serializing checking and starting the daemon, so one slow sandbox RPC doesn't
+# hold up turns in other threads, with how many callers hold or wait on each. An entry is
+# dropped when its last caller leaves. The dict itself is only touched between awaits.
+_agent_process_locks: dict[str, tuple[asyncio.Lock, int]] = {}
 
-def run_agent_turn(
+
+@contextlib.asynccontextmanager
+async def _agent_process_lock(sandbox_name: str):
+    lock, users = _agent_process_locks.get(sandbox_name, (None, 0))
+    lock = lock or asyncio.Lock()
+    _agent_process_locks[sandbox_name] = (lock, users + 1)
+    try:
+        async with lock:
+            yield
+    finally:
+        _, users = _agent_process_locks[sandbox_name]
+        if users == 1:
+            del _agent_process_locks[sandbox_name]
+        else:
+            _agent_process_locks[sandbox_name] = (lock, users - 1)
+
+
+async def get_agent_process(sb: modal.Sandbox, channel: str, thread_ts: str, sandbox_name: str) -> AgentProcess:
+    """Return a running agent process for the sandbox, starting one if needed."""
+    async with _agent_process_lock(sandbox_name):
+        agent = _agent_processes.get(sandbox_name)
+        if agent is not None and await agent.is_usable(sb):
+            return agent
+
+        # Forget daemons that have idled out on their own
+        now = time.monotonic()
+        for name, other in list(_agent_processes.items()):
+            if now - other.last_used > AGENT_IDLE_TIMEOUT:
+                del _agent_processes[name]
+
+        agent = await AgentProcess.start(sb, channel, thread_ts, sandbox_name)
+        _agent_processes[sandbox_name] = agent
+        return agent
+
+
+async def run_agent_turn(
     sb: modal.Sandbox, user_message: str, channel: str, thread_ts: str, sandbox_name: str
 ):
     """Execute one turn of Claude conversation in sandbox."""
-    args = [
-        "python", "-u",  # Unbuffered output for real-time logging
-        "/agent/agent_entrypoint.py",
-        "--message", user_message,
-        "--sandbox-name", sandbox_name,
-        "--sandbox-id", sb.object_id,
-    ]
-
-    if DEBUG_TOOL_USE:
-        args.extend(["--channel", channel, "--thread-ts", thread_ts])
-
+    agent = await get_agent_process(sb, channel, thread_ts, sandbox_name)
     logger.info(f"[{sandbox_name}] Starting agent turn")
-    process = sb.exec(*args)
+    async for result in agent.run_turn(user_message):
+        yield result
 
-    # Stream stdout - these are response lines for the user
-    for line in process.stdout:
-        line = line.strip()
-        if line:
-            logger.info(f"[{sandbox_name}] Response: {line[:100]}...")
-            yield {"response": line}
 
-    exit_code = process.wait()
-    logger.info(f"[{sandbox_name}] Agent exited with status {exit_code}")
+# When each thread was last posted to (LRU, oldest evicted first), for pacing posts
+_last_post: OrderedDict[tuple[str, str], float] = OrderedDict()
 
-    # Stderr contains [LOG] messages and actual errors
-    stderr = process.stderr.read()
-    if stderr:
-        for line in stderr.strip().split("\n"):
-            if line.startswith("[LOG]"):
-                # Internal log message - just log it, don't show user
-                logger.info(f"[{sandbox_name}] {line}")
-            else:
-                # Actual error - log and show user only if exit was non-zero
-                logger.error(f"[{sandbox_name}] STDERR: {line}")
-        # Only show errors to user if process failed
-        if exit_code != 0:
-            # Filter out [LOG] lines from error output
-            error_lines = [l for l in stderr.strip().split("\n") if not l.startswith("[LOG]")]
-            if error_lines:
-                yield {"response": f"*** ERROR ***\n" + "\n".join(error_lines)}
 
+async def post_message(client, channel: str, thread_ts: str, text: str) -> None:
+    """Post to a Slack thread, at most once per SLACK_POST_INTERVAL and honoring rate limits."""
+    from slack_sdk.errors import SlackApiError
 
-def post_status(client, channel: str, thread_ts: str, text: str, emoji: str = "⏳") -> None:
+    key = (channel, thread_ts)
+    while True:
+        # Re-check after every sleep: another post to this thread may have claimed the slot
+        while (wait := _last_post.get(key, 0.0) + SLACK_POST_INTERVAL - time.monotonic()) > 0:
+            await asyncio.sleep(wait)
+        _last_post[key] = time.monotonic()
+        _last_post.move_to_end(key)
+        if len(_last_post) > MAX_CACHED_THREADS:
+            _last_post.popitem(last=False)
+        try:
+            await client.chat_postMessage(channel=channel, thread_ts=thread_ts, text=text)
+            return
+        except SlackApiError as e:
+            if e.response.status_code != 429:
+                raise
+            retry_after = float(e.response.headers.get("Retry-After", SLACK_POST_INTERVAL))
+            logger.warning(f"Rate limited posting to {channel}, retrying in {retry_after}s")
+            _last_post[key] = time.monotonic() + retry_after - SLACK_POST_INTERVAL
+
+
+class ThreadPoster:
+    """Posts messages to one Slack thread in order, combining those queued while waiting to send."""
+
+    def __init__(self, client, channel: str, thread_ts: str):
+        self.client = client
+        self.channel = channel
+        self.thread_ts = thread_ts
+        self.pending: list[str] = []
+        self.task: asyncio.Task | None = None
+
+    def post(self, text: str) -> None:
+        self.pending.append(text)
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self._send_pending())
+
+    async def _send_pending(self) -> None:
+        while self.pending:
+            text = "\n\n".join(self.pending)
+            self.pending.clear()
+            await post_message(self.client, self.channel, self.thread_ts, text)
+
+    async def close(self) -> None:
+        """Wait for everything posted so far to be sent."""
+        if self.task is not None:
+            await self.task
+
+
+async def post_status(client, channel: str, thread_ts: str, text: str, emoji: str = "⏳") -> None:
     """Post a status update to the Slack thread."""
-    client.chat_postMessage(
-        channel=channel,
-        thread_ts=thread_ts,
-        text=f"{emoji} {text}",
-    )
+    await post_message(client, channel, thread_ts, f"{emoji} {text}")
+
+
+# Markdown -> Slack mrkdwn conversions, combined so each response is scanned once
+_MD_INLINE = (
+    r"\*\*(?P<bold_star>.+?)\*\*"  # **bold** -> *bold*
+    r"|__(?P<bold_under>.+?)__"  # __bold__ -> *bold*
+    r"|\[(?P<link_text>[^\]]+)\]\((?P<link_url>[^)]+)\)"  # [text](url) -> <url|text>
+)
+_MD_PATTERN = re.compile(
+    r"^#+ +(?P<header>.+)$|"  # # header -> *header* (Slack doesn't have headers)
+    + _MD_INLINE,
+    re.MULTILINE,
+)
+# Bodies never start a line, so only the inline conversions apply inside them
+_MD_INLINE_PATTERN = re.compile(_MD_INLINE)
+
+
+def _md_replace(match: re.Match) -> str:
+    if match.lastgroup == "link_url":
+        return f"<{match['link_url']}|{_MD_INLINE_PATTERN.sub(_md_replace, match['link_text'])}>"
+    # Bold and header bodies may themselves contain bold or links
+    return f"*{_MD_INLINE_PATTERN.sub(_md_replace, match[match.lastgroup])}*"
 
 
 def markdown_to_slack(text: str) -> str:
     """Convert markdown to Slack mrkdwn format."""
-    # Convert **bold** to *bold*
-    text = re.sub(r"\*\*(.+?)\*\*", r"*\1*", text)
-    # Convert __bold__ to *bold*
-    text = re.sub(r"__(.+?)__", r"*\1*", text)
-    # Convert ## headers to *bold* (Slack doesn't have headers)
-    text = re.sub(r"^##+ +(.+)$", r"*\1*", text, flags=re.MULTILINE)
-    # Convert # headers to *bold*
-    text = re.sub(r"^# +(.+)$", r"*\1*", text, flags=re.MULTILINE)
-    # Convert [text](url) to <url|text>
-    text = re.sub(r"\[([^\]]+)\]\(([^)]+)\)", r"<\2|\1>", text)
-    return text
+    return _MD_PATTERN.sub(_md_replace, text)
 
 
-# Track processed events to avoid duplicates
-_processed_events: set[str] = set()
+_MENTION_RE = re.compile(r"<@[A-Z0-9]+>")
+_MENTION_ID_CHARS = frozenset(string.ascii_uppercase + string.digits)
 
 
-def process_message(body, client, user_message):
-    """Process incoming Slack message and run agent."""
-    # Deduplicate: skip if we've already processed this event
+def strip_mentions(text: str) -> str:
+    """Remove user mentions (e.g. of the bot) from a message."""
+    # Fast path: a single leading mention, as in "@Oracle what does X do?"
+    if text.startswith("<@"):
+        end = text.find(">", 2, 32)
+        if end > 2 and _MENTION_ID_CHARS.issuperset(text[2:end]) and "<@" not in text[end:]:
+            return text[end + 1:].strip()
+    return _MENTION_RE.sub("", text).strip()
+
+
+# Track processed events to avoid duplicates (LRU, oldest evicted first). Handlers all run on
+# one event loop and never await mid-update, so these caches need no locks.
+MAX_PROCESSED_EVENTS = 1024
+_processed_events: OrderedDict[str, None] = OrderedDict()
+
+# Slack event_ids already handed to Bolt, with when they arrived (oldest first). Lets Slack's
+# redeliveries be answered before Bolt parses and dispatches them again.
+MAX_SEEN_EVENTS = 10_000
+SEEN_EVENT_TTL = 10 * 60
+_seen_events: OrderedDict[str, float] = OrderedDict()
+
+
+def is_seen_event(event_id: str) -> bool:
+    """Whether Bolt already accepted this event_id within SEEN_EVENT_TTL."""
+    cutoff = time.monotonic() - SEEN_EVENT_TTL
+    while _seen_events and next(iter(_seen_events.values())) < cutoff:
+        _seen_events.popitem(last=False)
+    return event_id in _seen_events
+
+
+def remember_seen_event(event_id: str) -> None:
+    _seen_events[event_id] = time.monotonic()
+    _seen_events.move_to_end(event_id)
+    if len(_seen_events) > MAX_SEEN_EVENTS:
+        _seen_events.popitem(last=False)
+
+
+# Whether a thread's root message mentioned the bot, keyed by (channel, thread_ts).
+# The root never changes, so only the first reply in a thread needs to ask Slack.
+MAX_CACHED_THREADS = 4096
+_bot_threads: OrderedDict[tuple[str, str], bool] = OrderedDict()
+
+
+async def is_bot_thread(client, channel: str, thread_ts: str, bot_user_id: str) -> bool:
+    """Check (with caching) whether the bot was mentioned in the thread root."""
+    key = (channel, thread_ts)
+    if key in _bot_threads:
+        _bot_threads.move_to_end(key)
+        return _bot_threads[key]
+
+    history = await client.conversations_replies(channel=channel, ts=thread_ts, limit=1)
+    is_bot = bool(history.get("messages")) and f"<@{bot_user_id}>" in history["messages"][0].get("text", "")
+
+    remember_bot_thread(channel, thread_ts, is_bot)
+    return is_bot
+
+
+def remember_bot_thread(channel: str, thread_ts: str, is_bot: bool = True) -> None:
+    """Record whether replies in this thread are for the bot."""
+    _bot_threads[(channel, thread_ts)] = is_bot
+    _bot_threads.move_to_end((channel, thread_ts))
+    if len(_bot_threads) > MAX_CACHED_THREADS:
+        _bot_threads.popitem(last=False)
+
+
+# Sandbox IDs this container has already run setup on (LRU, oldest evicted first). Other
+# containers run setup again; the REPO_FRESH_TTL sentinel keeps that cheap.
+MAX_INITIALIZED_SANDBOXES = 4096
+_initialized_sandboxes: OrderedDict[str, None] = OrderedDict()
+
+
+async def dispatch_message(body, user_message) -> None:
+    """Hand a message to a background worker, unless it's a duplicate delivery."""
+    # Deduplicate here, where every delivery lands; workers may run in other containers
     event_id = body["event"].get("client_msg_id") or body["event"]["ts"]
     if event_id in _processed_events:
+        _processed_events.move_to_end(event_id)
         logger.info(f"Skipping duplicate event: {event_id}")
         return
-    _processed_events.add(event_id)
-    # Keep set bounded
-    if len(_processed_events) > 1000:
-        _processed_events.clear()
+    _processed_events[event_id] = None
+    # Keep bounded without forgetting recent events
+    if len(_processed_events) > MAX_PROCESSED_EVENTS:
+        _processed_events.popitem(last=False)
+
+    # The payload travels with the spawned input, so a message can't be left behind or picked
+    # up by another message's worker; Modal spreads inputs across containers by max_inputs
+    await handle_slack_message.spawn.aio(body, user_message)
+
 
+async def process_message(body, client, user_message):
+    """Process incoming Slack message and run agent."""
     channel = body["event"]["channel"]
     thread_ts = body["event"].get("thread_ts", body["event"]["ts"])
 
@@ -194,13 +619,13 @@ def process_message(body, client, user_message):
     # Acquire sandbox first, then post status (avoids duplicate status messages)
     is_new_session = False
     try:
-        sb = modal.Sandbox.from_name(app_name=app.name, name=sandbox_name)
+        sb = await modal.Sandbox.from_name.aio(app_name=app.name, name=sandbox_name)
         logger.info(f"Reusing existing sandbox: {sandbox_name}")
     except modal.exception.NotFoundError:
         logger.info(f"Creating new sandbox: {sandbox_name}")
         is_new_session = True
         try:
-            sb = modal.Sandbox.create(
+            sb = await modal.Sandbox.create.aio(
                 app=app,
                 image=sandbox_image,
                 secrets=[slack_secret, github_deploy_key, github_token] if DEBUG_TOOL_USE else [github_deploy_key, github_token],
@@ -208,7 +633,9 @@ def process_message(body, client, user_message):
                 workdir="/app",
                 env={
                     "CLAUDE_CONFIG_DIR": (VOL_MOUNT_PATH / "claude-config").as_posix(),
-                    "ANTHROPIC_BASE_URL": anthropic_proxy.get_web_url(),
+                    "ANTHROPIC_BASE_URL": await anthropic_proxy.get_web_url.aio(),
+                    "UV_CACHE_DIR": UV_CACHE_DIR,
+                    "UV_LINK_MODE": "copy",  # Cache is on the volume, so hardlinks can't be used
                 },
                 idle_timeout=5 * 60,  # 5 min idle
                 timeout=5 * 60 * 60,  # 5 hour max
@@ -217,28 +644,59 @@ def process_message(body, client, user_message):
         except modal.exception.AlreadyExistsError:
             # Race condition: another request created it first, just use it
             logger.info(f"Sandbox created by concurrent request, reusing: {sandbox_name}")
-            sb = modal.Sandbox.from_name(app_name=app.name, name=sandbox_name)
+            sb = await modal.Sandbox.from_name.aio(app_name=app.name, name=sandbox_name)
             is_new_session = False  # Another request already posted status
 
+    # Ensure SSH, repo and /data are set up (idempotent operations), once per sandbox per container.
+    # sb.exec returns immediately, so setup runs while the status message is posted.
+    setup = None
+    if sb.object_id in _initialized_sandboxes:
+        _initialized_sandboxes.move_to_end(sb.object_id)
+        logger.info(f"[{sandbox_name}] Sandbox already set up, skipping setup")
+    else:
+        setup = await start_sandbox_setup(sb, sandbox_name)
+
     # Post sandbox status AFTER acquired (avoids duplicate messages from race condition)
     if is_new_session:
-        post_status(client, channel, thread_ts, "New sandbox", "🚀")
+        await post_status(client, channel, thread_ts, "New sandbox", "🚀")
     else:
-        post_status(client, channel, thread_ts, "Reusing sandbox", "🔄")
+        await post_status(client, channel, thread_ts, "Reusing sandbox", "🔄")
 
-    # Always ensure SSH and repo are set up (idempotent operations)
-    setup_github_ssh(sb)
-    clone_or_update_repo(sb)
+    if setup is not None and await wait_for_sandbox_setup(setup, sandbox_name):
+        _initialized_sandboxes[sb.object_id] = None
+        if len(_initialized_sandboxes) > MAX_INITIALIZED_SANDBOXES:
+            _initialized_sandboxes.popitem(last=False)
+
+    # Posting runs alongside the agent turn, so responses that arrive while a post is paced
+    # go out together in the next message
+    poster = ThreadPoster(client, channel, thread_ts)
+    try:
+        async for result in run_agent_turn(sb, user_message, channel, thread_ts, sandbox_name):
+            if result.get("response"):
+                # Convert markdown to Slack mrkdwn
+                poster.post(markdown_to_slack(result["response"]))
+    finally:
+        await poster.close()
 
-    # Set up /data symlink for session persistence
-    data_dir = (VOL_MOUNT_PATH / sandbox_name).as_posix()
-    sb.exec("bash", "-c", f"mkdir -p {data_dir} && ln -sf {data_dir} /data").wait()
 
-    for result in run_agent_turn(sb, user_message, channel, thread_ts, sandbox_name):
-        if result.get("response"):
-            # Convert markdown to Slack mrkdwn
-            slack_text = markdown_to_slack(result["response"])
-            client.chat_postMessage(channel=channel, text=slack_text, thread_ts=thread_ts)
+_slack_client = None
+
+
+@app.function(
+    secrets=[slack_secret, github_deploy_key, github_token],
+    image=slack_bot_image,
+    scaledown_window=300,  # 5 min idle
+    timeout=60 * 60,  # Agent turns can run long
+)
+@modal.concurrent(max_inputs=100)
+async def handle_slack_message(body: dict, user_message: str) -> None:
+    """Run one Slack message through its thread's sandbox, off the webhook's request path."""
+    global _slack_client
+    if _slack_client is None:
+        from slack_sdk.web.async_client import AsyncWebClient
+
+        _slack_client = AsyncWebClient(token=os.environ["SLACK_BOT_TOKEN"])
+    await process_message(body, _slack_client, user_message)
 
 
 @app.function(
@@ -249,27 +707,33 @@ def process_message(body, client, user_message):
 @modal.concurrent(max_inputs=100)
 @modal.asgi_app()
 def slack_bot():
-    from fastapi import FastAPI, Request
-    from slack_bolt import App as SlackApp
-    from slack_bolt.adapter.fastapi import SlackRequestHandler
+    from fastapi import FastAPI, Request, Response
+    from slack_bolt.adapter.fastapi.async_handler import AsyncSlackRequestHandler
+    from slack_bolt.async_app import AsyncApp
 
-    slack_app = SlackApp(
+    slack_app = AsyncApp(
         token=os.environ["SLACK_BOT_TOKEN"],
         signing_secret=os.environ["SLACK_SIGNING_SECRET"],
     )
 
     fastapi_app = FastAPI()
-    handler = SlackRequestHandler(slack_app)
+    handler = AsyncSlackRequestHandler(slack_app)
 
     @slack_app.event("app_mention")
-    def handle_mention(body, client, context, logger):
-        user_message = body["event"]["text"]
+    async def handle_mention(ack, body, client, context, logger):
+        await ack()
+        event = body["event"]
+        # A mention in the thread root makes follow-up replies the bot's; record it so they don't
+        # have to look the root up. Mentions further down the thread don't change that rule.
+        if event.get("thread_ts") in (None, event["ts"]):
+            remember_bot_thread(event["channel"], event["ts"])
         # Remove bot mention from message
-        user_message = re.sub(r"<@[A-Z0-9]+>", "", user_message).strip()
-        process_message(body, client, user_message)
+        user_message = strip_mentions(event["text"])
+        await dispatch_message(body, user_message)
 
     @slack_app.event("message")
-    def handle_message(body, client, context, logger):
+    async def handle_message(ack, body, client, context, logger):
+        await ack()
         event = body["event"]
         # Skip bot messages
         if event.get("subtype") == "bot_message" or event.get("bot_id"):
@@ -283,24 +747,29 @@ def slack_bot():
 
         # Check if bot was mentioned in thread root
         try:
-            history = client.conversations_replies(
-                channel=event["channel"],
-                ts=event["thread_ts"],
-                limit=1,
-            )
-            if (
-                not history.get("messages")
-                or f"<@{context.bot_user_id}>" not in history["messages"][0].get("text", "")
-            ):
+            if not await is_bot_thread(client, event["channel"], event["thread_ts"], context.bot_user_id):
                 return
         except Exception:
             return
 
         user_message = event["text"]
-        process_message(body, client, user_message)
+        await dispatch_message(body, user_message)
 
     @fastapi_app.post("/")
     async def root(request: Request):
-        return await handler.handle(request)
+        try:
+            event_id = json.loads(await request.body()).get("event_id")
+        except (ValueError, AttributeError):
+            event_id = None  # Not a JSON event callback (e.g. interactivity payloads)
+        if event_id and is_seen_event(event_id):
+            retry_num = request.headers.get("x-slack-retry-num")
+            logger.info(f"Skipping redelivered event {event_id} (retry {retry_num})")
+            return Response(headers={"X-Slack-No-Retry": "1"})
+
+        response = await handler.handle(request)
+        # Only remember events Bolt accepted, so unsigned requests can't claim an event_id
+        if event_id and response.status_code == 200:
+            remember_seen_event(event_id)
+        return response
 
     return fastapi_app
@@ -1,13 +1,34 @@
 import os
+import time
 
 import modal
 
-proxy_image = modal.Image.debian_slim(python_version="3.12").pip_install("httpx", "fastapi")
+proxy_image = modal.Image.debian_slim(python_version="3.12").pip_install("httpx", "h2", "fastapi")
 
 anthropic_secret = modal.Secret.from_name("anthropic-secret")  # ANTHROPIC_API_KEY
 
 app = modal.App("oracle-anthropic-proxy")
 
+SANDBOX_CHECK_TTL = 10.0  # Seconds to trust a sandbox ID after confirming it is running
+MAX_CACHED_SANDBOXES = 4096
+
+# Hop-by-hop headers (RFC 7230 §6.1) plus host/content-length, which httpx sets itself.
+# HTTP/2 upstreams reject connection-specific headers, so these must not be forwarded.
+HOP_BY_HOP_HEADERS = frozenset({
+    "host",
+    "content-length",
+    "connection",
+    "keep-alive",
+    "proxy-authenticate",
+    "proxy-authorization",
+    "te",
+    "trailer",
+    "transfer-encoding",
+    "upgrade",
+})
+# ASGI delivers request header names as lowercase bytes, so they can be checked as-is
+HOP_BY_HOP_HEADERS_RAW = frozenset(name.encode() for name in HOP_BY_HOP_HEADERS)
+
 
 @app.function(
     secrets=[anthropic_secret],
@@ -19,37 +40,82 @@ app = modal.App("oracle-anthropic-proxy")
 @modal.asgi_app()
 def anthropic_proxy():
     import httpx
-    from fastapi import FastAPI, HTTPException, Request, Response
+    from fastapi import FastAPI, HTTPException, Request
+    from fastapi.responses import StreamingResponse
+    from starlette.background import BackgroundTask
 
     proxy_app = FastAPI()
 
-    @proxy_app.api_route(
-        "/{path:path}", methods=["GET", "POST", "PUT", "DELETE", "PATCH", "OPTIONS", "HEAD"]
+    # Shared upstream client so connections to Anthropic are pooled and kept alive across requests.
+    # A small pool makes concurrent requests from all sandboxes multiplex over a few HTTP/2
+    # connections instead of opening one TLS session each.
+    client = httpx.AsyncClient(
+        base_url="https://api.anthropic.com",
+        http2=True,
+        timeout=httpx.Timeout(300.0, connect=10.0),
+        limits=httpx.Limits(max_keepalive_connections=8, max_connections=8),
     )
-    async def proxy(request: Request, path: str):
-        headers = {k: v for k, v in request.headers.items() if k.lower() not in ("host", "content-length")}
 
-        sandbox_id = headers.get("x-api-key")
-        if not sandbox_id:
-            raise HTTPException(status_code=403, detail="Missing x-api-key header")
+    @proxy_app.on_event("shutdown")
+    async def close_client():
+        await client.aclose()
+
+    # sandbox_id -> monotonic time it was last confirmed running
+    verified_sandboxes: dict[str, float] = {}
+
+    async def validate_sandbox(sandbox_id: str) -> None:
+        """Raise 403 unless the sandbox is running, skipping the Modal lookup if recently checked."""
+        if time.monotonic() - verified_sandboxes.get(sandbox_id, 0.0) < SANDBOX_CHECK_TTL:
+            return
 
         try:
             sb = await modal.Sandbox.from_id.aio(sandbox_id)
             if sb.returncode is not None:
+                verified_sandboxes.pop(sandbox_id, None)
                 raise HTTPException(status_code=403, detail="Sandbox no longer running")
         except modal.exception.NotFoundError:
+            verified_sandboxes.pop(sandbox_id, None)
             raise HTTPException(status_code=403, detail="Invalid sandbox ID")
 
+        if len(verified_sandboxes) >= MAX_CACHED_SANDBOXES:
+            verified_sandboxes.clear()
+        verified_sandboxes[sandbox_id] = time.monotonic()
+
+    @proxy_app.api_route(
+        "/{path:path}", methods=["GET", "POST", "PUT", "DELETE", "PATCH", "OPTIONS", "HEAD"]
+    )
+    async def proxy(request: Request, path: str):
+        # Filter the raw pairs, which keeps repeated headers and skips decoding every name
+        headers = httpx.Headers([(k, v) for k, v in request.headers.raw if k not in HOP_BY_HOP_HEADERS_RAW])
+
+        sandbox_id = headers.get("x-api-key")
+        if not sandbox_id:
+            raise HTTPException(status_code=403, detail="Missing x-api-key header")
+
+        await validate_sandbox(sandbox_id)
+
         headers["x-api-key"] = os.environ["ANTHROPIC_API_KEY"]
+        # The body is passed through undecoded, so only let upstream compress it if the client
+        # asked; otherwise httpx would add its own gzip/deflate Accept-Encoding
+        headers.setdefault("accept-encoding", "identity")
 
-        async with httpx.AsyncClient() as client:
-            resp = await client.post(
-                f"https://api.anthropic.com/{path}",
-                headers=headers,
-                content=await request.body(),
-                timeout=300.0,
-            )
+        upstream_request = client.build_request(
+            request.method,
+            f"/{path}",
+            headers=headers,
+            content=await request.body(),
+        )
+        # Stream the upstream body through as it arrives (SSE completions start immediately)
+        upstream = await client.send(upstream_request, stream=True)
 
-        return Response(content=resp.content, status_code=resp.status_code, media_type="application/json")
+        # Pass the body through still compressed (the sandbox's Accept-Encoding was forwarded), so
+        # content-encoding is kept; content-length is dropped and Starlette re-frames as chunked
+        response_headers = {k: v for k, v in upstream.headers.items() if k.lower() not in HOP_BY_HOP_HEADERS}
+        return StreamingResponse(
+            upstream.aiter_raw(),
+            status_code=upstream.status_code,
+            headers=response_headers,
+            background=BackgroundTask(upstream.aclose),
+        )
 
     return proxy_app
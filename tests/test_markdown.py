@@ -0,0 +1,22 @@
+from src.main import markdown_to_slack
+
+CASES = [
+    ("**bold**", "*bold*"),
+    ("__bold__", "*bold*"),
+    ("# Title", "*Title*"),
+    ("### Title", "*Title*"),
+    ("[text](https://example.com)", "<https://example.com|text>"),
+    ("## **bold** [x](u)", "**bold* <u|x>*"),
+    ("**[l](u)**", "*<u|l>*"),
+    # Header markers only count at the start of a line, never inside a bold or link body
+    ("**# a**", "*# a*"),
+    ("[# foo](u)", "<u|# foo>"),
+    ("# # a", "*# a*"),
+    ("# ## a", "*## a*"),
+    ("plain text", "plain text"),
+]
+
+
+def test_markdown_to_slack():
+    for text, expected in CASES:
+        assert markdown_to_slack(text) == expected, text